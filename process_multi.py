@@ -6,6 +6,7 @@ import time
 import numpy as np
 from sqlalchemy import create_engine
 from datetime import datetime
+from itertools import permutations
 from openpyxl import load_workbook  # for accurate rows/cols without loading whole sheet
 
 # Connection settings
@@ -72,9 +73,101 @@ def extract_metadata(file_path,original_name, uploaded_by=None):
 
     return metadata
 
-def process_education(df: pd.DataFrame) -> pd.DataFrame:
+# Expected inputs in argv order: (slot name, header row offset, required columns).
+# Required columns are every column the pipeline indexes without a fallback.
+INPUT_SPECS = [
+    ("Candidate Details", 1, ["Candidate ID", "Candidate City", "Candidate Province/County"]),
+    ("Domicile/CNIC", 0, ["Candidate Number", "CNIC Number"]),
+    ("Education", 1, ["CANDIDATEID", "PROJECTEDCOMPLETIONDATE", "DEGREE", "SCHOOLNAME", "AREAOFSTUDY"]),
+    ("Work Experience", 1, ["CANDIDATEID", "STARTDATE", "ENDDATE", "CURRENTJOB"]),
+]
+
+def read_header_rows(file_path, max_header=1):
+    """
+    Read only the first few rows of the first sheet, one set of column
+    names per possible header offset. Names are kept exactly as read_excel
+    reports them (not stripped), so the probe only accepts headers the full
+    reads can index.
+    """
+    head = pd.read_excel(file_path, header=None, nrows=max_header + 1)
+    rows = []
+    for offset in range(max_header + 1):
+        if offset < len(head):
+            rows.append({str(v) for v in head.iloc[offset] if pd.notna(v)})
+        else:
+            rows.append(set())
+    return rows
+
+def probe_inputs(files):
+    """
+    Detect which input each uploaded file is from its header row alone,
+    before any metadata insert or full workbook read.
+
+    Args:
+        files (list): (file_path, original_name) pairs in upload order.
+
+    Returns:
+        list: The same pairs reordered to match INPUT_SPECS.
+
+    Raises:
+        ValueError: If a file matches no input, or an input has no file.
+    """
+    max_header = max(offset for _, offset, _ in INPUT_SPECS)
+    headers = [read_header_rows(path, max_header) for path, _ in files]
+
+    fits = [
+        [set(required) <= headers[i][offset] for _, offset, required in INPUT_SPECS]
+        for i in range(len(files))
+    ]
+
+    # Best assignment of files to slots: most files matched, then most files
+    # left in their upload slot (the identity order is tried first)
+    slots = max(
+        permutations(range(len(INPUT_SPECS))),
+        key=lambda p: (sum(fits[i][s] for i, s in enumerate(p)),
+                       sum(i == s for i, s in enumerate(p)))
+    )
+
+    # Any file left on a slot it does not fit matched no free slot
+    errors = []
+    ordered = [None] * len(INPUT_SPECS)
+    for i, s in enumerate(slots):
+        path, name = files[i]
+        if fits[i][s]:
+            ordered[s] = files[i]
+            continue
+        slot, offset, required = INPUT_SPECS[s]
+        if any(fits[i]):
+            other = INPUT_SPECS[fits[i].index(True)][0]
+            errors.append(f"No {slot} file found; '{name}' is another {other} file")
+        else:
+            missing = [c for c in required if c not in headers[i][offset]]
+            errors.append(f"No {slot} file found; '{name}' is missing columns: {', '.join(missing)}")
+    if errors:
+        raise ValueError("; ".join(errors))
+
+    return ordered
+
+def aggregate_education(df: pd.DataFrame):
+    """
+    Build all per-candidate Education tables in a single pass: the date is
+    parsed once and the frame sorted once by (CANDIDATEID, latest date first).
+
+    Args:
+        df (pd.DataFrame): Input education DataFrame with columns:
+            - CANDIDATEID
+            - PROJECTEDCOMPLETIONDATE
+            - DEGREE
+            - SCHOOLNAME
+            - AREAOFSTUDY
+
+    Returns:
+        tuple:
+            - pd.DataFrame: Latest education row per candidate with last_degree.
+            - pd.DataFrame: Latest certificate per candidate (CANDIDATEID, CERTIFICATE).
+    """
     df = df.copy()
-    
+
     # Ensure PROJECTEDCOMPLETIONDATE is datetime
     df['PROJECTEDCOMPLETIONDATE'] = pd.to_datetime(
         df['PROJECTEDCOMPLETIONDATE'], format='%Y/%m', errors='coerce'
@@ -88,94 +181,145 @@ def process_education(df: pd.DataFrame) -> pd.DataFrame:
         'Other': 1
     }
 
-    # Function to compute last_degree per candidate
-    def determine_last_degree(group: pd.DataFrame) -> pd.Series:
-        if group['PROJECTEDCOMPLETIONDATE'].isna().all():
-            if group['SCHOOLNAME'].isna().all():
-                return pd.Series([None] * len(group), index=group.index)
-            else:
-                ranked_group = group[group['DEGREE'].isin(degree_rank)]
-                if ranked_group.empty:
-                    return pd.Series([None] * len(group), index=group.index)
-                ranked_group = ranked_group.copy()
-                ranked_group['rank'] = ranked_group['DEGREE'].map(degree_rank)
-                best_degree = ranked_group.loc[ranked_group['rank'].idxmax(), 'DEGREE']
-                return pd.Series([best_degree] * len(group), index=group.index)
-
-        # Sort by PROJECTEDCOMPLETIONDATE descending
-        group = group.sort_values('PROJECTEDCOMPLETIONDATE', ascending=False)
-        
-        for _, row in group.iterrows():
-            degree = row['DEGREE']
-            if pd.notna(row['PROJECTEDCOMPLETIONDATE']) and pd.notna(degree) and degree != 'Other':
-                return pd.Series([degree] * len(group), index=group.index)
-
-        return pd.Series(['Other'] * len(group), index=group.index)
-
-    # Add last_degree column
-    df['last_degree'] = (
-    df.groupby('CANDIDATEID')
-      .apply(determine_last_degree, include_groups=False)
-      .reset_index(level=0, drop=True)
-)
-
-    # Function to pick one row per candidate
-    def pick_one_row(group: pd.DataFrame) -> pd.DataFrame:
-        row=group.sort_values('PROJECTEDCOMPLETIONDATE', ascending=False).head(1)
-        row["CANDIDATEID"] = group.name
-        return row
-
-    # Get unique row per candidate
-    unique_df = (
-    df.groupby('CANDIDATEID', group_keys=False)
-      .apply(pick_one_row, include_groups=False
-             )
-      .reset_index(drop=True)
-)
-    
-    return unique_df
+    # One stable sort: latest date first per candidate, NaT last, ties keep file order
+    df = df[df['CANDIDATEID'].notna()].sort_values(
+        ['CANDIDATEID', 'PROJECTEDCOMPLETIONDATE'],
+        ascending=[True, False], na_position='last', kind='mergesort'
+    )
+    has_date = df['PROJECTEDCOMPLETIONDATE'].notna()
+
+    # Latest row per candidate; its date is NaT only if the candidate has no dates
+    unique_df = df.drop_duplicates(subset='CANDIDATEID').reset_index(drop=True)
+    dated = unique_df['PROJECTEDCOMPLETIONDATE'].notna()
+
+    # Dated candidates: latest dated degree that is not 'Other', else 'Other'
+    eligible = df[has_date & df['DEGREE'].notna() & (df['DEGREE'] != 'Other')]
+    latest_degree = eligible.drop_duplicates(subset='CANDIDATEID').set_index('CANDIDATEID')['DEGREE']
+
+    # Undated candidates with a school: highest ranked degree (first on ties)
+    undated_ids = unique_df.loc[~dated, 'CANDIDATEID']
+    undated = df[df['CANDIDATEID'].isin(undated_ids)]
+    with_school = set(undated.loc[undated['SCHOOLNAME'].notna(), 'CANDIDATEID'])
+    ranked = undated[undated['DEGREE'].isin(degree_rank)].copy()
+    ranked['rank'] = ranked['DEGREE'].map(degree_rank)
+    best_degree = (
+        ranked.sort_values('rank', ascending=False, kind='mergesort')
+              .drop_duplicates(subset='CANDIDATEID')
+              .set_index('CANDIDATEID')['DEGREE']
+    )
 
-def process_work_experience(df: pd.DataFrame) -> pd.DataFrame:
+    ids = unique_df['CANDIDATEID']
+    unique_df['last_degree'] = np.where(
+        dated,
+        ids.map(latest_degree).fillna('Other'),
+        ids.map(best_degree).where(ids.isin(with_school))
+    )
+
+    # Latest certificate per candidate (first non-empty AREAOFSTUDY, latest first)
+    cert_df = df[df['DEGREE'].str.strip().str.lower() == "certificate"]
+    if cert_df.empty:
+        cert = pd.DataFrame(columns=['CANDIDATEID', 'CERTIFICATE'])
+    else:
+        cert = (
+            cert_df.groupby('CANDIDATEID', as_index=False, sort=False)['AREAOFSTUDY'].first()
+                   .rename(columns={'AREAOFSTUDY': 'CERTIFICATE'})
+        )
+
+    return unique_df, cert
+
+def aggregate_work_experience(df: pd.DataFrame):
     """
-    Process Work_Experience DataFrame to select the latest work experience
-    per candidate based on STARTDATE, handling missing dates and CURRENTJOB.
+    Build all per-candidate Work_Experience tables in a single pass: dates are
+    parsed once and the frame sorted once by (CANDIDATEID, STARTDATE).
 
     Args:
         df (pd.DataFrame): Input work experience DataFrame with columns:
             - CANDIDATEID
             - STARTDATE
-            - CURRENTJOB (optional)
+            - ENDDATE
+            - CURRENTJOB
 
     Returns:
-        pd.DataFrame: Processed DataFrame with one representative row per candidate.
+        tuple:
+            - pd.DataFrame: One representative (latest) row per candidate,
+              handling missing dates and CURRENTJOB.
+            - pd.DataFrame: Total experience per candidate (CANDIDATEID,
+              TOTAL_EXPERIENCE_YEARS, EXPERIENCE_GROUP), merging overlapping
+              or continuous job periods.
+            - pd.DataFrame: Years with the current employer per candidate.
     """
     df = df.copy()
-    
-    # Ensure STARTDATE is datetime
-    df['STARTDATE'] = pd.to_datetime(df['STARTDATE'], errors='coerce')
 
-    # Step 1: Latest row per candidate where STARTDATE is not null
-    latest_idx = df[df['STARTDATE'].notna()].groupby('CANDIDATEID')['STARTDATE'].idxmax()
-    df_latest = df.loc[latest_idx].reset_index(drop=True)
+    # Ensure dates are datetime
+    df['STARTDATE'] = pd.to_datetime(df['STARTDATE'], errors='coerce')
+    df['ENDDATE'] = pd.to_datetime(df['ENDDATE'], errors='coerce')
 
-    # Step 2: Handle rows where STARTDATE is NaT
-    temp = df[df['STARTDATE'].isna()].copy()
+    # One stable sort: ascending STARTDATE per candidate, NaT first, ties keep file order
+    has_id = df['CANDIDATEID'].notna()
+    ordered = df[has_id].sort_values(
+        ['CANDIDATEID', 'STARTDATE'], na_position='first', kind='mergesort'
+    )
+    dated = ordered[ordered['STARTDATE'].notna()]
+
+    # --- Latest row per candidate where STARTDATE is not null
+    # (first row in file order among ties on the latest STARTDATE)
+    df_latest = (
+        dated.drop_duplicates(subset=['CANDIDATEID', 'STARTDATE'])
+             .drop_duplicates(subset='CANDIDATEID', keep='last')
+             .reset_index(drop=True)
+    )
 
-    # Remove candidates already included in df_latest
-    df_latest_ids = set(df_latest['CANDIDATEID'].unique())
-    temp = temp[~temp['CANDIDATEID'].isin(df_latest_ids)].reset_index(drop=True)
+    # Rows where STARTDATE is NaT, for candidates not already included
+    temp = df[df['STARTDATE'].isna()]
+    temp = temp[~temp['CANDIDATEID'].isin(set(df_latest['CANDIDATEID']))].reset_index(drop=True)
 
-    # Step 3: Separate CURRENTJOB missing vs not missing
+    # Separate CURRENTJOB missing vs not missing; one row per candidate for the latter
     temp_no_current = temp[temp['CURRENTJOB'].isna()]
-    temp_with_current = temp[temp['CURRENTJOB'].notna()]
-
-    # Keep only one row per candidate for CURRENTJOB not missing
-    temp_with_current_unique = temp_with_current.drop_duplicates(subset='CANDIDATEID').reset_index(drop=True)
+    temp_with_current_unique = (
+        temp[temp['CURRENTJOB'].notna()]
+        .drop_duplicates(subset='CANDIDATEID')
+        .reset_index(drop=True)
+    )
 
-    # Step 4: Concatenate all relevant rows
     df_final = pd.concat([df_latest, temp_no_current, temp_with_current_unique], ignore_index=True)
-    
-    return df_final
+
+    # --- Total experience: walk each candidate's jobs by ascending STARTDATE,
+    # jobs with the same STARTDATE in file order
+    today = pd.to_datetime(datetime.today().date())
+    start = dated['STARTDATE']
+    end = dated['ENDDATE'].fillna(today)
+    by_candidate = dated['CANDIDATEID']
+
+    # A job opens a new period unless it starts on or before the furthest end so far
+    reach = end.groupby(by_candidate).cummax()
+    prev_reach = reach.groupby(by_candidate).shift()
+    period = (prev_reach.isna() | (start > prev_reach)).cumsum()
+
+    periods = pd.DataFrame({'CANDIDATEID': by_candidate, 'start': start, 'end': end, 'period': period})
+    periods = periods.groupby('period', sort=False).agg(
+        CANDIDATEID=('CANDIDATEID', 'first'), start=('start', 'first'), end=('end', 'max')
+    )
+    periods['days'] = (periods['end'] - periods['start']).dt.days
+
+    wx = periods.groupby('CANDIDATEID', sort=True)['days'].sum().reset_index()
+    wx['TOTAL_EXPERIENCE_YEARS'] = (wx['days'] / 365).round(2)
+    years = wx['TOTAL_EXPERIENCE_YEARS']
+    wx['EXPERIENCE_GROUP'] = np.select(
+        [years < 0.5, years <= 5, years <= 10, years <= 15, years <= 20],
+        ["No Experience", "0-5 Years", "6-10 Years", "11-15 Years", "16-20 Years"],
+        default="21+ Years"
+    )
+    wx = wx[['CANDIDATEID', 'TOTAL_EXPERIENCE_YEARS', 'EXPERIENCE_GROUP']]
+
+    # --- Current employer: latest STARTDATE among current jobs per candidate
+    # (NaT sorts first, so the last row is NaT only if no current job has a date)
+    current = ordered[ordered['CURRENTJOB'] == 'Y'].drop_duplicates(subset='CANDIDATEID', keep='last')
+    current_ex = current[['CANDIDATEID']].reset_index(drop=True)
+    current_ex['Experience with Current Employers in Years'] = (
+        (pd.Timestamp(datetime.today()) - current['STARTDATE']).dt.days / 365.25
+    ).to_numpy()
+
+    return df_final, wx, current_ex
 
 def process_domicile(df: pd.DataFrame) -> pd.DataFrame:
     """
@@ -211,102 +355,6 @@ def process_candidate_details(df: pd.DataFrame) -> pd.DataFrame:
     
     return df
 
-def calculate_experience(df: pd.DataFrame) -> pd.DataFrame:
-    """
-    Calculate total years of experience for each candidate,
-    merging overlapping or continuous job periods.
-    """
-
-    # Ensure dates are datetime
-    df['STARTDATE'] = pd.to_datetime(df['STARTDATE'], errors='coerce')
-    df['ENDDATE'] = pd.to_datetime(df['ENDDATE'], errors='coerce')
-
-    # Drop rows with no STARTDATE
-    df = df.dropna(subset=['STARTDATE']).copy()
-
-    # Replace missing ENDDATE with today's date
-    today = pd.to_datetime(datetime.today().date())
-    df['ENDDATE'] = df['ENDDATE'].fillna(today)
-
-    results = []
-
-    for candidate_id, group in df.groupby('CANDIDATEID'):
-        # Sort by start date
-        jobs = group[['STARTDATE','ENDDATE']].sort_values('STARTDATE').values.tolist()
-
-        merged = []
-        for start, end in jobs:
-            start = pd.to_datetime(start)  # ensure Timestamp
-            end = pd.to_datetime(end)
-            
-            if not merged:
-                merged.append([start, end])
-            else:
-                last_start, last_end = merged[-1]
-                # Merge if overlapping or continuous
-                if start <= last_end:
-                    merged[-1][1] = max(last_end, end)
-                else:
-                    merged.append([start, end])
-
-        # Total duration in days
-        total_days = sum((end - start).days for start, end in merged)
-        total_years = round(total_days / 365, 2)
-        if total_years == "-":
-            exp_group = "-"
-        elif total_years < 0.5:
-            exp_group = "No Experience"
-        elif total_years <= 5:
-            exp_group = "0-5 Years"
-        elif total_years <= 10:
-            exp_group = "6-10 Years"
-        elif total_years <= 15:
-            exp_group = "11-15 Years"
-        elif total_years <= 20:
-            exp_group = "16-20 Years"
-        else:
-            exp_group = "21+ Years"
-
-        results.append([candidate_id, total_years, exp_group])
-
-        
-
-    return pd.DataFrame(results, columns=['CANDIDATEID','TOTAL_EXPERIENCE_YEARS','EXPERIENCE_GROUP'])
-
-def current_experience(df):
-    # Ensure date columns are datetime
-    df['STARTDATE'] = pd.to_datetime(df['STARTDATE'], errors='coerce')
-    df['ENDDATE'] = pd.to_datetime(df['ENDDATE'], errors='coerce')
-    
-    # Filter current jobs
-    current_jobs = df[df['CURRENTJOB'] == 'Y'].copy()
-    
-    # Take the latest start date per candidate
-    latest_start = current_jobs.groupby('CANDIDATEID')['STARTDATE'].max().reset_index()
-    
-    # Calculate experience in years
-    latest_start['Experience with Current Employers in Years'] = latest_start['STARTDATE'].apply(lambda x: (datetime.today() - x).days / 365.25)
-    
-    return latest_start[['CANDIDATEID', 'Experience with Current Employers in Years']]
-
-def get_latest_certificate(df: pd.DataFrame) -> pd.DataFrame:
-    # Ensure PROJECTEDCOMPLETIONDATE is datetime (ignore errors for blanks)
-    df['PROJECTEDCOMPLETIONDATE'] = pd.to_datetime(df['PROJECTEDCOMPLETIONDATE'], errors='coerce', format='%Y/%m')
-
-    # Filter only Certificate degree
-    cert_df = df[df['DEGREE'].str.strip().str.lower() == "certificate"].copy()
-
-    if cert_df.empty:
-        return pd.DataFrame(columns=['CANDIDATEID', 'AREAOFSTUDY'])
-
-    # Sort by CANDIDATEID and PROJECTEDCOMPLETIONDATE (latest first)
-    cert_df = cert_df.sort_values(by=['CANDIDATEID', 'PROJECTEDCOMPLETIONDATE'], ascending=[True, False])
-
-    # Drop duplicates keeping the latest date (or first occurrence if date is NaT)
-    result = cert_df.groupby('CANDIDATEID', as_index=False).first()[['CANDIDATEID', 'AREAOFSTUDY']]
-    result = result[['CANDIDATEID', 'AREAOFSTUDY']].rename(columns={'AREAOFSTUDY': 'CERTIFICATE'})
-    return result
-
 def assign_category(df: pd.DataFrame) -> pd.DataFrame:
     """
     Assigns 'category' and 'category_district' based on:
@@ -392,6 +440,23 @@ if __name__ == "__main__":
         uploaded_by   # ✅ new arg
     ) = sys.argv[1:]
 
+    # Fail fast on wrong or misplaced files before any DB insert or full read
+    try:
+        (
+            (file1_path, file1_name),
+            (file2_path, file2_name),
+            (file3_path, file3_name),
+            (file4_path, file4_name),
+        ) = probe_inputs([
+            (file1_path, file1_name),
+            (file2_path, file2_name),
+            (file3_path, file3_name),
+            (file4_path, file4_name),
+        ])
+    except Exception as e:
+        print(str(e), file=sys.stderr)
+        sys.exit(1)
+
     all_metadata = []
     for p, n in [
         (file1_path, file1_name),
@@ -427,14 +492,10 @@ if __name__ == "__main__":
 
 
         # Save first file to output AFTER successful insert
-        df_Education = process_education(education)
-        df_WorkExperience = process_work_experience(work_experience)
+        df_Education, cert = aggregate_education(education)
+        df_WorkExperience, wx, currentEx = aggregate_work_experience(work_experience)
         df_Domicile = process_domicile(domicile_cnic)
         df_CandidateDetails = process_candidate_details(candidate_details)
-
-        wx=calculate_experience(work_experience)
-        currentEx=current_experience(work_experience)
-        cert=get_latest_certificate(education)
         
 
         df_CandidateDetails = df_CandidateDetails.rename(columns={'Candidate ID': 'Candidate ID'})